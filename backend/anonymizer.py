@@ -1,9 +1,30 @@
 # anonymizer.py
+import argparse
+import os
 import re
 import secrets
+import shutil
 import string
 import sys
+import tempfile
 from pathlib import Path
+from typing import Iterable
+
+from matcher import (
+    BOUNDARY_AUTO,
+    TermMatcher,
+    TokenMatcher,
+    boundary_pattern,
+    decoder_for,
+    matcher_for,
+)
+from streaming import (
+    DEFAULT_CHUNK_SIZE,
+    MarkerCollector,
+    WindowedReplacer,
+    iter_chunks,
+    replace_stream,
+)
 
 INPUT_FILE = "input.txt"
 MAP_FILE = "mapping.txt"  # Format: <TOKEN> = <ORIGINAL>
@@ -59,70 +80,193 @@ _MARKED = re.compile(r"\[\[(.+?)\]\]")  # [[...]] (auch Phrasen mit Leerzeichen)
 
 
 def _word_boundary_pattern(term: str) -> re.Pattern:
-    esc = re.escape(term)
-    # \b nur, wenn term "wortartig" ist; sonst exakter Escape
-    if re.fullmatch(r"[0-9A-Za-zÄÖÜäöüß_]+", term):
-        return re.compile(rf"\b{esc}\b")
-    return re.compile(esc)
+    # Grenze nur an Enden, die Wortzeichen sind (Phrasen, Satzzeichen bleiben exakt)
+    return boundary_pattern(term, BOUNDARY_AUTO)
 
 
 # --- Encode / Decode auf INPUT_FILE in place ---
-def encode_text(src: str, forward: dict[str, str]) -> tuple[str, dict[str, str]]:
+def encode_text(
+    src: str, forward: dict[str, str], *, matcher: TermMatcher | None = None
+) -> tuple[str, dict[str, str]]:
     """
     forward: ORIGINAL -> TOKEN (wird ggf. ergänzt)
+    matcher: optional bereits aufgebauter Matcher zu forward (z. B. aus dem
+             API-Cache); neue Begriffe werden dort mit eingetragen
     """
     # 1) Markierte Begriffe sammeln, Tokens vergeben (neu oder aus Mapping)
     marked = _MARKED.findall(src)
     for term in marked:
         if term not in forward:
             forward[term] = anonymize(term)
+            if matcher is not None:
+                matcher.add(term, forward[term])
 
-    # 2) Markierte Stellen direkt ersetzen
-    def _repl_marked(m: re.Match) -> str:
-        term = m.group(1)
-        tok = forward.setdefault(term, anonymize(term))
-        return tok
-
-    out = _MARKED.sub(_repl_marked, src)
-
-    # 3) Unmarkierte Vorkommen bereits bekannter Begriffe ersetzen
-    for term, tok in forward.items():
-        pat = _word_boundary_pattern(term)
-        out = pat.sub(tok, out)
+    # 2) Alle bekannten Begriffe (markiert oder nicht) in einem Durchlauf
+    #    ersetzen; bei Überlappung gewinnt der längste Treffer
+    if matcher is None:
+        matcher = matcher_for(forward, boundary=BOUNDARY_AUTO)
+    out = matcher.sub(src)
 
-    # 4) Restliche Klammern (falls übrig) strippen
+    # 3) Restliche Klammern (falls übrig) strippen
     out = out.replace("[[", "").replace("]]", "")
     return out, forward
 
 
-def decode_text(src: str, reverse: dict[str, str]) -> str:
+def decode_text(
+    src: str, reverse: dict[str, str], *, matcher: TokenMatcher | None = None
+) -> str:
     """
     reverse: TOKEN -> ORIGINAL
+    Ein Durchlauf über token-förmige Kandidaten, Nachschlagen im Dict.
+    """
+    if matcher is None:
+        matcher = decoder_for(reverse)
+    return matcher.sub(src)
+
+
+# --- Streaming: große Dateien blockweise, Ergebnis atomar per Rename ---
+def _atomic_write(path: Path, pieces: Iterable[str]) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for piece in pieces:
+                f.write(piece)
+            f.flush()
+            os.fsync(f.fileno())
+        if path.exists():
+            shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def rewrite_file(
+    path: Path, replacer: WindowedReplacer, *, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> None:
+    """Datei blockweise durch replacer schicken und atomar ersetzen."""
+    with path.open("r", encoding="utf-8") as f:
+        _atomic_write(path, replace_stream(iter_chunks(f, chunk_size), replacer))
+
+
+def collect_marked_file(
+    path: Path, *, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> list[str]:
+    """Markierte Begriffe einer Datei in Reihenfolge des Auftretens (ohne Duplikate)."""
+    collector = MarkerCollector(_MARKED)
+    terms: dict[str, None] = {}
+    with path.open("r", encoding="utf-8") as f:
+        for chunk in iter_chunks(f, chunk_size):
+            terms.update(dict.fromkeys(collector.feed(chunk)))
+    terms.update(dict.fromkeys(collector.close()))
+    return list(terms)
+
+
+def encode_file(
+    path: Path, forward: dict[str, str], *, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> dict[str, str]:
+    """
+    Wie encode_text, aber mit konstantem Speicher:
+      1. Durchlauf: markierte Begriffe sammeln, Tokens vergeben
+      2. Durchlauf: ersetzen, in Temp-Datei schreiben, per Rename übernehmen
     """
-    out = src
-    for tok, term in reverse.items():
-        pat = _word_boundary_pattern(tok)
-        out = pat.sub(term, out)
-    return out
+    for term in collect_marked_file(path, chunk_size=chunk_size):
+        if term not in forward:
+            forward[term] = anonymize(term)
+
+    replacer = WindowedReplacer(
+        matcher_for(forward, boundary=BOUNDARY_AUTO), strip=True
+    )
+    rewrite_file(path, replacer, chunk_size=chunk_size)
+    return forward
+
+
+def decode_file(
+    path: Path, reverse: dict[str, str], *, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> None:
+    """Wie decode_text, blockweise mit konstantem Speicher."""
+    rewrite_file(path, WindowedReplacer(decoder_for(reverse)), chunk_size=chunk_size)
 
 
 # --- CLI ---
+USAGE = (
+    "Usage: python anonymizer.py [encode|decode] [--stream] [--chunk-size N]\n"
+    "       python anonymizer.py [encode|decode] PATH|DIR|GLOB ..."
+    " [--workers N] [--pattern GLOB]\n"
+    "       python anonymizer.py compact"
+)
+
+
+def _parse_options(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="anonymizer.py", usage=USAGE)
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="batch mode: files, directories or globs instead of input.txt",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="process input.txt in chunks (bounded memory for very large files)",
+    )
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="batch mode: process pool size"
+    )
+    parser.add_argument(
+        "--pattern", default="*.txt", help="batch mode: file glob for directories"
+    )
+    return parser.parse_args(args)
+
+
 def main(argv: list[str]) -> int:
-    if len(argv) < 2 or argv[1] not in {"encode", "decode"}:
-        print("Usage: python anonymizer.py [encode|decode]")
+    if len(argv) < 2 or argv[1] not in {"encode", "decode", "compact"}:
+        print(USAGE)
         return 2
 
+    if argv[1] == "compact":
+        # Journal (angehängte Zeilen der API) sortiert und atomar neu schreiben
+        from storage import FileMappingStore
+
+        FileMappingStore(Path.cwd() / MAP_FILE).compact()
+        return 0
+
     mode = argv[1]
+    try:
+        opts = _parse_options(argv[2:])
+    except SystemExit as exc:
+        return int(exc.code or 0)
     cwd = Path.cwd()
     in_path = cwd / INPUT_FILE
     map_path = cwd / MAP_FILE
 
+    if opts.paths:
+        from batch import expand_paths, run_batch
+
+        files = expand_paths(opts.paths, opts.pattern)
+        if not files:
+            print("No input files matched.", file=sys.stderr)
+            return 1
+        run_batch(
+            mode, files, map_path, workers=opts.workers, chunk_size=opts.chunk_size
+        )
+        return 0
+
     forward, reverse = load_mapping(map_path)
 
+    if not in_path.exists():
+        print(f"Input file not found: {INPUT_FILE}", file=sys.stderr)
+        return 1
+
+    if opts.stream:
+        if mode == "encode":
+            forward2 = encode_file(in_path, forward, chunk_size=opts.chunk_size)
+            save_mapping(map_path, forward2)
+        else:
+            decode_file(in_path, reverse, chunk_size=opts.chunk_size)
+        return 0
+
     if mode == "encode":
-        if not in_path.exists():
-            print(f"Input file not found: {INPUT_FILE}", file=sys.stderr)
-            return 1
         src = in_path.read_text(encoding="utf-8")
         out, forward2 = encode_text(src, forward)
         in_path.write_text(
@@ -132,9 +276,6 @@ def main(argv: list[str]) -> int:
         return 0
 
     if mode == "decode":
-        if not in_path.exists():
-            print(f"Input file not found: {INPUT_FILE}", file=sys.stderr)
-            return 1
         src = in_path.read_text(encoding="utf-8")
         out = decode_text(src, reverse)
         in_path.write_text(out, encoding="utf-8")  # IN PLACE zurückschreiben
@@ -10,6 +10,8 @@ import re
 import secrets
 import string
 
+from matcher import BOUNDARY_WORD, boundary_pattern, decoder_for, matcher_for
+
 # Default configuration; callers may override hash_length
 DEFAULT_HASH_LENGTH = 8
 HASH_ALPHABET = string.ascii_letters + string.digits
@@ -73,7 +75,7 @@ def _word_boundary_pattern(original: str) -> re.Pattern:
     - Use \b on both ends: works for phrases with spaces; ensures 'whole token' match.
     - Escape original literally.
     """
-    return re.compile(rf"\b{re.escape(original)}\b")
+    return boundary_pattern(original, BOUNDARY_WORD)
 
 
 def encode_text(
@@ -88,7 +90,7 @@ def encode_text(
       1) Detect marked tokens [[...]] in the input text.
       2) Ensure each marked token is present in mapping (create new hash if needed).
       3) Replace ALL occurrences (marked or not) of EVERY KNOWN original (from mapping)
-         across the whole text with its hash (order: longest originals first).
+         across the whole text with its hash in a single scan (longest match wins).
       4) Strip any remaining brackets [[...]] -> plain word/phrase.
 
     Returns:
@@ -107,13 +109,9 @@ def encode_text(
             orig_to_hash[original] = new_hash
             newly_created[new_hash] = original
 
-    # Step 3: replace using full mapping (apply longest originals first to avoid
-    # partial overlaps)
-    new_text = text
-    for original in sorted(orig_to_hash.keys(), key=len, reverse=True):
-        h = orig_to_hash[original]
-        pat = _word_boundary_pattern(original)
-        new_text = pat.sub(h, new_text)
+    # Step 3: replace using full mapping in one pass (longest match wins at each
+    # position, so overlapping originals behave as before)
+    new_text = matcher_for(orig_to_hash, boundary=BOUNDARY_WORD).sub(text)
 
     # Step 4: strip any remaining [[...]] -> inner text
     new_text = ENCODE_PATTERN.sub(lambda m: m.group(1), new_text)
@@ -128,14 +126,11 @@ def decode_text(
     hash_length: int = DEFAULT_HASH_LENGTH,
 ) -> str:
     """
-    Decode hashes back to originals for tokens that:
-      - are exactly `hash_length` alphanumeric chars and
-      - exist in the current mapping.
-    """
-    hash_regex = re.compile(rf"\b([A-Za-z0-9]{{{hash_length}}})\b")
+    Decode hashes back to originals for tokens that exist in the current mapping.
 
-    def repl(m: re.Match) -> str:
-        token = m.group(1)
-        return hash_to_orig.get(token, token)
-
-    return hash_regex.sub(repl, text)
+    Candidates are found in one scan for every token shape present in the
+    mapping (generated `hash_length` tokens as well as client-supplied ones of
+    other lengths), then looked up in the dict. `hash_length` is kept for API
+    compatibility; the shapes come from the mapping itself.
+    """
+    return decoder_for(hash_to_orig).sub(text)
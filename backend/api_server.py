@@ -1,20 +1,42 @@
 # api_server.py
 from __future__ import annotations
 
+import codecs
+import json
+import os
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI
+from typing import AsyncIterator
+
+from fastapi import BackgroundTasks, FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 import anonymizer  # package-relative import aus backend.anonymizer
+import storage
+from matcher import TokenMatcher
+from streaming import StreamEncoder, WindowedReplacer
 
 # NEW: lightweight environment logging (no behavior change)
 import logging
 from detect_env import running_in_container, running_under_uvicorn
 
-app = FastAPI(title="Anonymizer API")
 logger = logging.getLogger("anonymizer")
 
+
+@asynccontextmanager
+async def _lifespan(_: FastAPI) -> AsyncIterator[None]:
+    _log_environment()
+    yield
+    # Store-Ressourcen (z. B. SQLite-Verbindungspool) sauber schließen
+    for cache in list(_caches.values()):
+        cache.store.close()
+
+
+app = FastAPI(title="Anonymizer API", lifespan=_lifespan)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:4200", "http://127.0.0.1:4200"],
@@ -35,7 +57,88 @@ class TextOut(BaseModel):
     mapping: dict[str, str]  # ORIGINAL -> TOKEN
 
 
+class BatchIn(BaseModel):
+    texts: list[str]
+    mapping: dict[str, str] | None = None  # ORIGINAL -> TOKEN (optional)
+
+
+class BatchOut(BaseModel):
+    texts: list[str]  # gleiche Reihenfolge wie BatchIn.texts
+    mapping: dict[str, str]  # ORIGINAL -> TOKEN
+
+
 MAP_PATH = Path("mapping.txt")
+# "file" (mapping.txt, Default) oder "sqlite" (MAP_PATH mit Endung .db; beim
+# ersten Start wird ein vorhandenes mapping.txt einmalig importiert)
+MAP_STORE = os.getenv("MAP_STORE", "file")
+
+# Mapping + Matcher bleiben im Prozess; neu geladen wird nur, wenn sich die
+# Datei geändert hat (inode/mtime/size). Key = aufgelöster Pfad, damit Tests
+# MAP_PATH umbiegen bzw. das CWD wechseln können.
+_caches: dict[Path, storage.MappingCache] = {}
+
+# "cache" (Default): ganzes Mapping im Prozess halten. "selective": pro Request
+# nur die Einträge laden, die das Dokument treffen kann (Store-Lookups mit
+# IN (...) gegen indizierte Spalten; sinnvoll mit MAP_STORE=sqlite). Die
+# Antwort enthält dann nur diesen Ausschnitt des Mappings.
+MAP_LOOKUP = os.getenv("MAP_LOOKUP", "cache")
+
+# Neue Paare werden nur angehängt (Journal); nach so vielen Einträgen wird die
+# Datei im Hintergrund sortiert neu geschrieben.
+COMPACT_EVERY = int(os.getenv("MAP_COMPACT_EVERY", "1000"))
+
+
+# Group Commit: neue Paare mehrerer Requests sammeln und höchstens alle
+# MAP_WRITE_BEHIND_MS Millisekunden (oder ab MAP_WRITE_BEHIND_BATCH Paaren) in
+# einer Transaktion schreiben. 0 = aus (jeder Request schreibt selbst).
+# MAP_DURABLE=1: Antwort erst nach dem Commit; 0: sofort antworten.
+WRITE_BEHIND_MS = int(os.getenv("MAP_WRITE_BEHIND_MS", "0"))
+WRITE_BEHIND_BATCH = int(os.getenv("MAP_WRITE_BEHIND_BATCH", "1000"))
+DURABLE = os.getenv("MAP_DURABLE", "1") == "1"
+
+
+def _open_store(path: Path) -> storage.MappingStore:
+    store: storage.MappingStore
+    if MAP_STORE == "sqlite":
+        store = storage.SqliteMappingStore(path.with_suffix(".db"))
+        store.migrate_from_file(path)
+    else:
+        store = storage.FileMappingStore(path)
+    if WRITE_BEHIND_MS > 0:
+        store = storage.WriteBehindStore(
+            store, interval=WRITE_BEHIND_MS / 1000, max_batch=WRITE_BEHIND_BATCH
+        )
+    return store
+
+
+def _cache() -> storage.MappingCache:
+    key = MAP_PATH.resolve()
+    cache = _caches.get(key)
+    if cache is None:
+        cache = _caches.setdefault(key, storage.MappingCache(_open_store(key)))
+    return cache
+
+
+def _mapping_cache() -> storage.MappingCache:
+    return _cache().refresh()
+
+
+def _encode_mapping(text: str, client: dict[str, str] | None) -> storage.MappingCache:
+    if MAP_LOOKUP != "selective":
+        return _mapping_cache()
+    return storage.DocumentMapping.for_encode(_cache().store, text, client or ())
+
+
+def _decode_mapping(text: str) -> storage.MappingCache:
+    if MAP_LOOKUP != "selective":
+        return _mapping_cache()
+    return storage.DocumentMapping.for_decode(_cache().store, text)
+
+
+def _compact_if_due(cache: storage.MappingCache) -> None:
+    with cache.lock:
+        if getattr(cache.store, "appended", 0) >= COMPACT_EVERY:
+            cache.compact()
 
 
 @app.get("/health")
@@ -43,41 +146,255 @@ def health() -> dict:
     return {"ok": True}
 
 
-# Log detection at startup – mapping remains file-based
-@app.on_event("startup")
+# Log detection at startup (lifespan)
 def _log_environment() -> None:
     try:
         mode = "container" if running_in_container() else "host"
         server = "uvicorn" if running_under_uvicorn() else "other"
-        logger.info(f"[env] mode={mode} server={server} mapping=file:{MAP_PATH}")
+        logger.info(f"[env] mode={mode} server={server} mapping={MAP_STORE}:{MAP_PATH}")
     except Exception as exc:
         logger.warning(f"[env] detection failed: {exc!r}")
 
 
-@app.post("/encode", response_model=TextOut)
-def encode(req: TextIn) -> TextOut:
-    forward, _ = anonymizer.load_mapping(MAP_PATH)  # ORIGINAL->TOKEN, TOKEN->ORIGINAL
-    # optionales Mapping des Clients übernehmen (ORIGINAL->TOKEN)
-    if req.mapping:
-        for orig, tok in req.mapping.items():
-            forward.setdefault(orig, tok)
+def _encode_all(
+    texts: list[str], client: dict[str, str] | None, background: BackgroundTasks
+) -> tuple[list[str], dict[str, str]]:
+    """Alle Texte gegen einen Snapshot kodieren; neue Paare einmal persistieren."""
+    cache = _encode_mapping("\n".join(texts), client)
+    with cache.lock:
+        forward = cache.forward  # ORIGINAL->TOKEN (Snapshot, wird ergänzt)
+        created: dict[str, str] = {}
+        # optionales Mapping des Clients übernehmen (ORIGINAL->TOKEN)
+        if client:
+            for orig, tok in client.items():
+                if orig not in forward:
+                    cache.add(orig, tok)
+                    created[orig] = tok
 
-    out_text, forward2 = anonymizer.encode_text(req.text, forward)
-    anonymizer.save_mapping(MAP_PATH, forward2)  # speichert als "TOKEN = ORIGINAL"
-    return TextOut(text=out_text, mapping=forward2)
+        size_before = len(forward)
+        matcher = cache.term_matcher()
+        out_texts = [
+            anonymizer.encode_text(text, forward, matcher=matcher)[0] for text in texts
+        ]
+        created.update(cache.adopt_new(size_before))
+        commit = cache.append(created)  # nur neue Paare schreiben
+        mapping_out = dict(forward)  # Kopie unter Lock
+    # außerhalb des Locks warten, damit andere Requests in denselben Commit kommen
+    if commit is not None and DURABLE:
+        commit.wait()
+    if created:
+        background.add_task(_compact_if_due, cache)
+    return out_texts, mapping_out
+
+
+def _decode_all(
+    texts: list[str], client: dict[str, str] | None
+) -> tuple[list[str], dict[str, str]]:
+    cache = _decode_mapping("\n".join(texts))
+    with cache.lock:
+        forward, reverse = cache.forward, cache.reverse
+        decoder = cache.token_matcher()
+        # optionales Mapping des Clients mergen (ORIGINAL->TOKEN), ohne den
+        # Cache zu verändern: nur unbekannte Einträge kosten eine Kopie
+        if client:
+            extra = {o: t for o, t in client.items() if o not in forward}
+            unknown = {t: o for o, t in client.items() if t not in reverse}
+            if extra:
+                forward = {**forward, **extra}
+            if unknown:
+                reverse = {**reverse, **unknown}
+                decoder = TokenMatcher(reverse)
+        # Rückgabe wieder konsistent als ORIGINAL->TOKEN (Kopie unter Lock)
+        mapping_out = dict(forward)
+
+    out_texts = [
+        anonymizer.decode_text(text, reverse, matcher=decoder) for text in texts
+    ]
+    return out_texts, mapping_out
+
+
+@app.post("/encode", response_model=TextOut)
+def encode(req: TextIn, background: BackgroundTasks) -> TextOut:
+    (out_text,), mapping = _encode_all([req.text], req.mapping, background)
+    return TextOut(text=out_text, mapping=mapping)
 
 
 @app.post("/decode", response_model=TextOut)
 def decode(req: TextIn) -> TextOut:
-    forward, reverse = anonymizer.load_mapping(
-        MAP_PATH
-    )  # ORIGINAL->TOKEN, TOKEN->ORIGINAL
-    # optionales Mapping des Clients mergen (ORIGINAL->TOKEN)
-    if req.mapping:
-        for orig, tok in req.mapping.items():
-            forward.setdefault(orig, tok)
-            reverse.setdefault(tok, orig)
-
-    out_text = anonymizer.decode_text(req.text, reverse)
-    # Rückgabe wieder konsistent als ORIGINAL->TOKEN
-    return TextOut(text=out_text, mapping=forward)
+    (out_text,), mapping = _decode_all([req.text], req.mapping)
+    return TextOut(text=out_text, mapping=mapping)
+
+
+# Batch: viele Dokumente pro Request (Ingestion-Jobs). Ein Snapshot, ein
+# Persistenzschritt; texts[i] der Antwort gehört zu texts[i] der Anfrage.
+@app.post("/encode/batch", response_model=BatchOut)
+def encode_batch(req: BatchIn, background: BackgroundTasks) -> BatchOut:
+    texts, mapping = _encode_all(req.texts, req.mapping, background)
+    return BatchOut(texts=texts, mapping=mapping)
+
+
+@app.post("/decode/batch", response_model=BatchOut)
+def decode_batch(req: BatchIn) -> BatchOut:
+    texts, mapping = _decode_all(req.texts, req.mapping)
+    return BatchOut(texts=texts, mapping=mapping)
+
+
+# ---------------------------------------------------------------------------
+# Streaming: Body als text/plain (ein Dokument, beliebig groß) oder
+# application/x-ndjson (ein {"text": ...} pro Zeile). Speicher bleibt durch das
+# Fenster der Matcher bzw. die Größe eines Datensatzes begrenzt.
+# Neue Paare werden vor der Ausgabe persistiert, die sie verwendet.
+# ---------------------------------------------------------------------------
+NDJSON = "application/x-ndjson"
+
+
+async def _body_text(request: Request) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    async for raw in request.stream():
+        text = decoder.decode(raw)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _record_text(line: str) -> str:
+    try:
+        text = json.loads(line)["text"]
+    except (ValueError, KeyError, TypeError):
+        text = None
+    if not isinstance(text, str):
+        raise ValueError(f"invalid NDJSON record: {line[:80]!r}")
+    return text
+
+
+async def _ndjson_records(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    buf = ""
+    async for chunk in chunks:
+        buf += chunk
+        *lines, buf = buf.split("\n")
+        for line in lines:
+            if line.strip():
+                yield _record_text(line)
+    if buf.strip():
+        yield _record_text(buf)
+
+
+def _ndjson_line(obj: dict) -> str:
+    return json.dumps(obj, ensure_ascii=False) + "\n"
+
+
+class _EncodeSession:
+    """Ein Streaming-Encode: Cache-Lock nur pro Chunk bzw. Datensatz."""
+
+    def __init__(self) -> None:
+        self.cache = _mapping_cache()
+        self.matcher = self.cache.term_matcher()
+        self.created: dict[str, str] = {}
+        self._new: dict[str, str] = {}
+        self.engine = StreamEncoder(self.matcher, anonymizer._MARKED, self._assign)
+
+    def _assign(self, term: str) -> None:
+        token = self.cache.forward.get(term)
+        if token is None:
+            token = anonymizer.anonymize(term)
+            self.cache.add(term, token)
+            self._new[term] = token
+        # der Cache kann inzwischen neu geladen sein -> eigenen Matcher pflegen
+        self.matcher.add(term, token)
+
+    def _persist(self) -> storage.Commit | None:
+        new, self._new = self._new, {}
+        self.created.update(new)
+        return self.cache.append(new)
+
+    def _step(self, work) -> str:
+        with self.cache.lock:
+            out = work()
+            commit = self._persist()
+        if commit is not None and DURABLE:
+            commit.wait()
+        return out
+
+    def feed(self, chunk: str) -> str:
+        return self._step(lambda: self.engine.feed(chunk))
+
+    def close(self) -> str:
+        return self._step(self.engine.close)
+
+    def record(self, text: str) -> str:
+        def work() -> str:
+            size_before = len(self.cache.forward)
+            out, _ = anonymizer.encode_text(
+                text, self.cache.forward, matcher=self.matcher
+            )
+            self._new.update(self.cache.adopt_new(size_before))
+            return out
+
+        return self._step(work)
+
+
+@app.post("/encode/stream")
+async def encode_stream(request: Request, background: BackgroundTasks):
+    session = await run_in_threadpool(_EncodeSession)
+    background.add_task(_compact_if_due, session.cache)
+    chunks = _body_text(request)
+
+    if request.headers.get("content-type", "").startswith(NDJSON):
+
+        async def records() -> AsyncIterator[str]:
+            try:
+                async for text in _ndjson_records(chunks):
+                    out = await run_in_threadpool(session.record, text)
+                    yield _ndjson_line({"text": out})
+            except ValueError as exc:  # Status ist schon gesendet
+                yield _ndjson_line({"error": str(exc)})
+            # zum Schluss nur die in diesem Request neu vergebenen Paare
+            yield _ndjson_line({"mapping": session.created})
+
+        return StreamingResponse(records(), media_type=NDJSON)
+
+    async def plain() -> AsyncIterator[str]:
+        async for chunk in chunks:
+            out = await run_in_threadpool(session.feed, chunk)
+            if out:
+                yield out
+        tail = await run_in_threadpool(session.close)
+        if tail:
+            yield tail
+
+    return StreamingResponse(plain(), media_type="text/plain; charset=utf-8")
+
+
+@app.post("/decode/stream")
+async def decode_stream(request: Request):
+    cache = await run_in_threadpool(_mapping_cache)
+    with cache.lock:
+        decoder = cache.token_matcher()
+    chunks = _body_text(request)
+
+    if request.headers.get("content-type", "").startswith(NDJSON):
+
+        async def records() -> AsyncIterator[str]:
+            try:
+                async for text in _ndjson_records(chunks):
+                    out = await run_in_threadpool(decoder.sub, text)
+                    yield _ndjson_line({"text": out})
+            except ValueError as exc:
+                yield _ndjson_line({"error": str(exc)})
+
+        return StreamingResponse(records(), media_type=NDJSON)
+
+    replacer = WindowedReplacer(decoder)
+
+    async def plain() -> AsyncIterator[str]:
+        async for chunk in chunks:
+            out = await run_in_threadpool(replacer.feed, chunk)
+            if out:
+                yield out
+        tail = await run_in_threadpool(replacer.close)
+        if tail:
+            yield tail
+
+    return StreamingResponse(plain(), media_type="text/plain; charset=utf-8")
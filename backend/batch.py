@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+"""
+Batch mode for the CLI: encode/decode many files with a process pool.
+
+Encode runs in three phases so token assignment stays consistent:
+  1. workers collect the marked terms of each file (parallel)
+  2. the parent assigns tokens in a deterministic order (sorted paths, then
+     order of appearance) and writes mapping.txt once
+  3. workers rewrite the files against that one mapping (parallel)
+"""
+
+from __future__ import annotations
+
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, TypeVar
+
+import anonymizer
+from matcher import BOUNDARY_AUTO, TermMatcher, TokenMatcher
+from streaming import DEFAULT_CHUNK_SIZE, WindowedReplacer
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass
+class FileResult:
+    path: Path
+    size: int  # bytes read
+    seconds: float
+
+
+def expand_paths(specs: Iterable[str], pattern: str = "*.txt") -> list[Path]:
+    """Files, directories (recursively, matching pattern) and globs -> sorted files."""
+    found: set[Path] = set()
+    for spec in specs:
+        p = Path(spec)
+        if p.is_dir():
+            found.update(f for f in p.rglob(pattern) if f.is_file())
+        elif p.is_file():
+            found.add(p)
+        else:
+            found.update(Path(f) for f in glob.glob(spec, recursive=True))
+    return sorted(f for f in found if f.is_file())
+
+
+# --- worker side: matcher is built once per process by the pool initializer ---
+_worker_matcher: TermMatcher | TokenMatcher | None = None
+
+
+def _init_worker(mode: str, mapping: dict[str, str]) -> None:
+    global _worker_matcher
+    if mode == "encode":
+        _worker_matcher = TermMatcher(mapping, boundary=BOUNDARY_AUTO)
+    else:
+        _worker_matcher = TokenMatcher(mapping)
+
+
+def _collect(path: Path, chunk_size: int) -> list[str]:
+    return anonymizer.collect_marked_file(path, chunk_size=chunk_size)
+
+
+def _rewrite(path: Path, chunk_size: int) -> FileResult:
+    assert _worker_matcher is not None
+    started = time.perf_counter()
+    size = path.stat().st_size
+    replacer = WindowedReplacer(
+        _worker_matcher, strip=isinstance(_worker_matcher, TermMatcher)
+    )
+    anonymizer.rewrite_file(path, replacer, chunk_size=chunk_size)
+    return FileResult(path, size, time.perf_counter() - started)
+
+
+def _pool_map(
+    fn: Callable[..., R],
+    items: list[T],
+    *args,
+    workers: int,
+    initializer: Callable[..., None] | None = None,
+    initargs: tuple = (),
+) -> list[R]:
+    if workers <= 1 or len(items) <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [fn(item, *args) for item in items]
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(items)),
+        initializer=initializer,
+        initargs=initargs,
+    ) as pool:
+        return list(pool.map(fn, items, *[[a] * len(items) for a in args]))
+
+
+def _mb(n: float) -> float:
+    return n / (1024 * 1024)
+
+
+def report(mode: str, results: list[FileResult], wall: float) -> str:
+    lines = [
+        f"{mode} {r.path}: {_mb(r.size):.2f} MB in {r.seconds:.3f} s"
+        f" ({_mb(r.size) / max(r.seconds, 1e-9):.2f} MB/s)"
+        for r in results
+    ]
+    total = sum(r.size for r in results)
+    lines.append(
+        f"total: {len(results)} files, {_mb(total):.2f} MB in {wall:.3f} s"
+        f" ({_mb(total) / max(wall, 1e-9):.2f} MB/s)"
+    )
+    return "\n".join(lines)
+
+
+def run_batch(
+    mode: str,
+    paths: list[Path],
+    map_path: Path,
+    *,
+    workers: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> list[FileResult]:
+    """Encode/decode paths in place; mapping.txt is read once and written once."""
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    forward, reverse = anonymizer.load_mapping(map_path)
+
+    if mode == "encode":
+        per_file = _pool_map(_collect, paths, chunk_size, workers=workers)
+        created = False
+        for terms in per_file:  # paths are sorted -> deterministic assignment
+            for term in terms:
+                if term not in forward:
+                    forward[term] = anonymizer.anonymize(term)
+                    created = True
+        if created:
+            anonymizer.save_mapping(map_path, forward)
+        mapping = forward
+    else:
+        mapping = reverse
+
+    results = _pool_map(
+        _rewrite,
+        paths,
+        chunk_size,
+        workers=workers,
+        initializer=_init_worker,
+        initargs=(mode, mapping),
+    )
+    print(report(mode, results, time.perf_counter() - started))
+    return results
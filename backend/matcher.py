@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+
+"""
+Single-pass matching engines shared by anonymizer (CLI/API) and anonymizer_core.
+
+Encode: instead of running one regex per mapping entry over the whole text,
+known originals are indexed by their leading word (or leading non-word
+character). One scan over the text yields candidate positions, each candidate
+is looked up in the index and verified with plain string comparisons.
+
+Decode: tokens are found by scanning once for token-shaped candidates (one
+regex per distinct token shape, not per token) and looking them up in a dict.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Container, Iterator, Mapping
+
+# Boundary modes
+#   word: \b on both ends, like anonymizer_core's historic r"\b{term}\b"
+#   auto: only guard ends that are word characters, so phrases and terms with
+#         punctuation at their edges still match (anonymizer's rule)
+BOUNDARY_WORD = "word"
+BOUNDARY_AUTO = "auto"
+
+_LEAD_WORD = re.compile(r"\w+")
+_ALNUM_RUN = re.compile(r"[A-Za-z0-9]+")
+
+
+def _is_word(ch: str) -> bool:
+    # Same definition as re's \w for str patterns
+    return ch.isalnum() or ch == "_"
+
+
+def lead_key(term: str) -> str:
+    """Index key of a term: its leading word run, else its first character."""
+    lead = _LEAD_WORD.match(term)
+    return lead.group() if lead else term[:1]
+
+
+def lead_keys(text: str) -> set[str]:
+    """
+    Every key a TermMatcher scan of text can look up (word runs plus non-word
+    characters), i.e. the only index buckets a document can ever hit.
+    """
+    keys = set(_LEAD_WORD.findall(text))
+    keys.update(ch for ch in set(text) if not _is_word(ch))
+    return keys
+
+
+class PatternCache:
+    """
+    Bounded LRU cache of compiled patterns keyed by (term, boundary mode).
+
+    re's own cache only holds a few hundred entries, so with large mappings
+    every lookup would recompile. hits/misses are counted to size the cache
+    per deployment (ANONYMIZER_PATTERN_CACHE_SIZE).
+    """
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[tuple[str, str], re.Pattern] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, term: str, boundary: str) -> re.Pattern:
+        key = (term, boundary)
+        with self._lock:
+            pat = self._data.get(key)
+            if pat is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return pat
+            self.misses += 1
+        pat = _compile_pattern(term, boundary)
+        with self._lock:
+            self._data[key] = pat
+            self._data.move_to_end(key)
+            self._shrink(self.maxsize)
+        return pat
+
+    def _shrink(self, size: int) -> None:
+        while len(self._data) > max(size, 0):
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize: int) -> None:
+        with self._lock:
+            self.maxsize = maxsize
+            self._shrink(maxsize)
+
+    def retain(self, live: Container[str], boundary: str) -> int:
+        """Evict entries of this boundary mode whose term is not in live."""
+        with self._lock:
+            stale = [k for k in self._data if k[1] == boundary and k[0] not in live]
+            for key in stale:
+                del self._data[key]
+            self.evictions += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Token shape regexes share the cache under their own mode
+_SHAPE = "shape"
+
+
+def _compile_pattern(term: str, boundary: str) -> re.Pattern:
+    if boundary == _SHAPE:
+        return re.compile(term)
+    esc = re.escape(term)
+    if boundary == BOUNDARY_WORD:
+        return re.compile(rf"\b{esc}\b")
+    head = r"(?<!\w)" if _is_word(term[:1]) else ""
+    tail = r"(?!\w)" if _is_word(term[-1:]) else ""
+    return re.compile(f"{head}{esc}{tail}")
+
+
+pattern_cache = PatternCache(int(os.getenv("ANONYMIZER_PATTERN_CACHE_SIZE", "4096")))
+
+
+def boundary_pattern(term: str, boundary: str = BOUNDARY_AUTO) -> re.Pattern:
+    """Compiled per-term regex equivalent of the matcher's boundary rule (cached)."""
+    return pattern_cache.get(term, boundary)
+
+
+class TermMatcher:
+    """
+    Leftmost-longest matcher for a set of known originals (ORIGINAL -> TOKEN).
+
+    Terms can be added incrementally; the index never needs a full rebuild when
+    a document introduces new originals.
+    """
+
+    def __init__(
+        self,
+        mapping: Mapping[str, str] | None = None,
+        *,
+        boundary: str = BOUNDARY_AUTO,
+    ) -> None:
+        if boundary not in (BOUNDARY_WORD, BOUNDARY_AUTO):
+            raise ValueError(f"unknown boundary mode: {boundary!r}")
+        self.boundary = boundary
+        self.max_len = 0
+        self._tokens: dict[str, str] = {}
+        # leading word run -> terms, longest first
+        self._by_word: dict[str, list[str]] = {}
+        # leading non-word character -> terms, longest first
+        self._by_char: dict[str, list[str]] = {}
+        self._scanner: re.Pattern | None = None
+        if mapping:
+            self.update(mapping)
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def __contains__(self, term: object) -> bool:
+        return term in self._tokens
+
+    # --- index maintenance ---
+    def add(self, term: str, token: str) -> None:
+        if not term:
+            return
+        if term in self._tokens:
+            self._tokens[term] = token
+            return
+        self._tokens[term] = token
+        key = lead_key(term)
+        if _is_word(key[0]):
+            bucket = self._by_word.setdefault(key, [])
+        else:
+            bucket = self._by_char.setdefault(key, [])
+            self._scanner = None  # character class changed
+        i = 0
+        while i < len(bucket) and len(bucket[i]) >= len(term):
+            i += 1
+        bucket.insert(i, term)
+        if len(term) > self.max_len:
+            self.max_len = len(term)
+
+    def update(self, mapping: Mapping[str, str]) -> None:
+        for term, token in mapping.items():
+            self.add(term, token)
+
+    def sync(self, mapping: Mapping[str, str]) -> bool:
+        """
+        Bring the index in line with mapping if mapping only gained entries.
+        Returns False if entries were removed or changed (caller must rebuild).
+        """
+        if len(mapping) < len(self._tokens):
+            return False
+        if not self._tokens.items() <= mapping.items():
+            return False
+        if len(mapping) > len(self._tokens):
+            for term in mapping.keys() - self._tokens.keys():
+                self.add(term, mapping[term])
+        return True
+
+    # --- matching ---
+    def _get_scanner(self) -> re.Pattern:
+        scanner = self._scanner
+        if scanner is None:
+            chars = "".join(re.escape(c) for c in sorted(self._by_char))
+            scanner = re.compile(rf"\w+|[{chars}]" if chars else r"\w+")
+            self._scanner = scanner
+        return scanner
+
+    def _bounded(self, text: str, start: int, end: int, term: str) -> bool:
+        before = _is_word(text[start - 1]) if start else False
+        after = _is_word(text[end]) if end < len(text) else False
+        first, last = _is_word(term[0]), _is_word(term[-1])
+        if self.boundary == BOUNDARY_WORD:
+            return before != first and after != last
+        return not (first and before) and not (last and after)
+
+    def iter_matches(
+        self, text: str, pos: int = 0, endpos: int | None = None
+    ) -> Iterator[tuple[int, int, str]]:
+        """
+        Yield (start, end, token) for non-overlapping matches starting in
+        [pos, endpos). Characters before pos/after endpos are still used as
+        boundary context.
+        """
+        stop = len(text) if endpos is None else endpos
+        by_word, by_char, tokens = self._by_word, self._by_char, self._tokens
+        last = pos
+        for m in self._get_scanner().finditer(text, pos):
+            start = m.start()
+            if start >= stop:
+                break
+            if start < last:
+                continue
+            piece = m.group()
+            bucket = by_word.get(piece) if _is_word(piece[0]) else by_char.get(piece)
+            if not bucket:
+                continue
+            for term in bucket:
+                end = start + len(term)
+                if text.startswith(term, start) and self._bounded(
+                    text, start, end, term
+                ):
+                    yield start, end, tokens[term]
+                    last = end
+                    break
+
+    def sub(self, text: str) -> str:
+        """Replace every known original in text with its token (single pass)."""
+        parts: list[str] = []
+        last = 0
+        for start, end, token in self.iter_matches(text):
+            parts.append(text[last:start])
+            parts.append(token)
+            last = end
+        if not parts:
+            return text
+        parts.append(text[last:])
+        return "".join(parts)
+
+
+# One matcher per boundary mode, kept across calls and extended in place as the
+# mapping grows. A mapping that lost or changed entries triggers a rebuild.
+_matchers: dict[str, TermMatcher] = {}
+_matchers_lock = threading.Lock()
+
+
+def matcher_for(
+    mapping: Mapping[str, str], *, boundary: str = BOUNDARY_AUTO
+) -> TermMatcher:
+    """Return a TermMatcher for mapping, reusing the cached one where possible."""
+    with _matchers_lock:
+        matcher = _matchers.get(boundary)
+        if matcher is None or not matcher.sync(mapping):
+            matcher = TermMatcher(mapping, boundary=boundary)
+            _matchers[boundary] = matcher
+            pattern_cache.retain(mapping, boundary)
+        return matcher
+
+
+def token_shape(token: str) -> str:
+    """
+    Regex for all strings shaped like token: alphanumeric runs become character
+    classes of the same length, everything else stays literal.
+    "A-NEW-9999" -> [A-Za-z0-9]{1}\\-[A-Za-z0-9]{3}\\-[A-Za-z0-9]{4}
+    """
+    parts: list[str] = []
+    last = 0
+    for m in _ALNUM_RUN.finditer(token):
+        parts.append(re.escape(token[last : m.start()]))
+        parts.append(f"[A-Za-z0-9]{{{m.end() - m.start()}}}")
+        last = m.end()
+    parts.append(re.escape(token[last:]))
+    head = r"(?<!\w)" if _is_word(token[:1]) else ""
+    tail = r"(?!\w)" if _is_word(token[-1:]) else ""
+    return head + "".join(parts) + tail
+
+
+class TokenMatcher:
+    """
+    Decode engine: TOKEN -> ORIGINAL lookups for token-shaped candidates.
+
+    The shape index is built from the tokens that actually exist in the
+    mapping, so fixed-length generated tokens and client-supplied tokens of
+    other lengths/layouts are decoded in the same scan.
+    """
+
+    def __init__(self, reverse: Mapping[str, str] | None = None) -> None:
+        self.max_len = 0
+        self._originals: dict[str, str] = {}
+        # shape regex -> token length; longest shapes are tried first
+        self._shapes: dict[str, int] = {}
+        self._scanner: re.Pattern | None = None
+        self._shape_patterns: list[re.Pattern] = []
+        if reverse:
+            self.update(reverse)
+
+    def __len__(self) -> int:
+        return len(self._originals)
+
+    @classmethod
+    def from_shapes(cls, shapes: Mapping[str, int]) -> "TokenMatcher":
+        """Shape index only (shape regex -> token length), for candidates()."""
+        dec = cls()
+        for shape, length in shapes.items():
+            dec._add_shape(shape, length)
+        return dec
+
+    def _add_shape(self, shape: str, length: int) -> None:
+        if shape not in self._shapes:
+            self._shapes[shape] = length
+            self._scanner = None
+        if length > self.max_len:
+            self.max_len = length
+
+    def add(self, token: str, original: str) -> None:
+        if not token:
+            return
+        if token not in self._originals:
+            self._add_shape(token_shape(token), len(token))
+        self._originals[token] = original
+
+    def update(self, reverse: Mapping[str, str]) -> None:
+        for token, original in reverse.items():
+            self.add(token, original)
+
+    def sync(self, reverse: Mapping[str, str]) -> bool:
+        """Same contract as TermMatcher.sync, for TOKEN -> ORIGINAL."""
+        if len(reverse) < len(self._originals):
+            return False
+        if not self._originals.items() <= reverse.items():
+            return False
+        if len(reverse) > len(self._originals):
+            for token in reverse.keys() - self._originals.keys():
+                self.add(token, reverse[token])
+        return True
+
+    def _get_scanner(self) -> re.Pattern | None:
+        if self._scanner is None and self._shapes:
+            shapes = sorted(self._shapes, key=self._shapes.__getitem__, reverse=True)
+            self._shape_patterns = [pattern_cache.get(s, _SHAPE) for s in shapes]
+            self._scanner = re.compile("|".join(shapes))
+        return self._scanner
+
+    def iter_matches(
+        self, text: str, pos: int = 0, endpos: int | None = None
+    ) -> Iterator[tuple[int, int, str]]:
+        """Yield (start, end, original) for known tokens starting in [pos, endpos)."""
+        scanner = self._get_scanner()
+        if scanner is None:
+            return
+        stop = len(text) if endpos is None else endpos
+        originals = self._originals
+        last = pos
+        for m in scanner.finditer(text, pos):
+            start = m.start()
+            if start >= stop:
+                break
+            if start < last:
+                continue
+            original = originals.get(m.group())
+            if original is not None:
+                yield start, m.end(), original
+                last = m.end()
+                continue
+            # Miss on the longest shape: a shorter shape may still be a token here
+            for pat in self._shape_patterns:
+                mm = pat.match(text, start)
+                if mm is None or mm.end() >= m.end():
+                    continue
+                original = originals.get(mm.group())
+                if original is not None:
+                    yield start, mm.end(), original
+                    last = mm.end()
+                    break
+
+    def candidates(self, text: str) -> set[str]:
+        """
+        Every token-shaped substring iter_matches could look up, known or not.
+        Resolving just these against a store yields all tokens text can hit.
+        """
+        scanner = self._get_scanner()
+        if scanner is None:
+            return set()
+        found: set[str] = set()
+        for m in scanner.finditer(text):
+            found.add(m.group())
+            for pat in self._shape_patterns:
+                mm = pat.match(text, m.start())
+                if mm is not None and mm.end() < m.end():
+                    found.add(mm.group())
+        return found
+
+    def sub(self, text: str) -> str:
+        """Replace every known token in text with its original (single pass)."""
+        parts: list[str] = []
+        last = 0
+        for start, end, original in self.iter_matches(text):
+            parts.append(text[last:start])
+            parts.append(original)
+            last = end
+        if not parts:
+            return text
+        parts.append(text[last:])
+        return "".join(parts)
+
+
+_decoder: TokenMatcher | None = None
+
+
+def decoder_for(reverse: Mapping[str, str]) -> TokenMatcher:
+    """Return a TokenMatcher for reverse, reusing the cached one where possible."""
+    global _decoder
+    with _matchers_lock:
+        if _decoder is None or not _decoder.sync(reverse):
+            _decoder = TokenMatcher(reverse)
+            pattern_cache.retain(_decoder._shapes, _SHAPE)
+        return _decoder
@@ -1,8 +1,23 @@
 from __future__ import annotations
 
+from itertools import islice
 from pathlib import Path
-from typing import Dict, Tuple, Iterable
+import os
+import shutil
+import tempfile
+from typing import Dict, Hashable, Optional, Tuple, Iterable
 import sqlite3
+import threading
+import time
+
+from matcher import (
+    BOUNDARY_AUTO,
+    TermMatcher,
+    TokenMatcher,
+    lead_key,
+    lead_keys,
+    token_shape,
+)
 
 
 class MappingStore:
@@ -19,6 +34,46 @@ class MappingStore:
         """Persist ORIGINAL -> TOKEN mapping."""
         raise NotImplementedError
 
+    def append(self, new_pairs: Dict[str, str]) -> None:
+        """Persist only newly created ORIGINAL -> TOKEN pairs (default: full save)."""
+        if not new_pairs:
+            return
+        forward, _ = self.load()
+        forward.update(new_pairs)
+        self.save(forward)
+
+    def compact(self) -> None:
+        """Rewrite the canonical representation (no-op unless the store journals)."""
+
+    def version(self) -> Optional[Hashable]:
+        """Cheap change marker for caches; None means unknown (always reload)."""
+        return None
+
+    def close(self) -> None:
+        """Release resources (connections); the store may be reused afterwards."""
+
+    # --- selective lookups (default: filter a full load) ---
+    def lookup_originals(self, originals: Iterable[str]) -> Dict[str, str]:
+        """ORIGINAL -> TOKEN for those of originals that are known."""
+        forward, _ = self.load()
+        return {o: forward[o] for o in originals if o in forward}
+
+    def lookup_tokens(self, tokens: Iterable[str]) -> Dict[str, str]:
+        """TOKEN -> ORIGINAL for those of tokens that are known."""
+        _, reverse = self.load()
+        return {t: reverse[t] for t in tokens if t in reverse}
+
+    def lookup_leads(self, keys: Iterable[str]) -> Dict[str, str]:
+        """ORIGINAL -> TOKEN for all originals whose matcher.lead_key is in keys."""
+        wanted = set(keys)
+        forward, _ = self.load()
+        return {o: t for o, t in forward.items() if lead_key(o) in wanted}
+
+    def token_shapes(self) -> Dict[str, int]:
+        """matcher.token_shape of every stored token -> token length."""
+        _, reverse = self.load()
+        return {token_shape(t): len(t) for t in reverse}
+
 
 # -------------------------------
 # File-backed store (current default)
@@ -27,10 +82,14 @@ class FileMappingStore(MappingStore):
     """
     Plain-text mapping file with lines "TOKEN = ORIGINAL".
     Stable, human-friendly, CLI-first.
+
+    append() only adds new lines at the end (journal); later lines win when
+    loading. compact() rewrites the sorted canonical file.
     """
 
     def __init__(self, path: Path) -> None:
         self.path = Path(path)
+        self.appended = 0  # entries journaled since the last save/compact
 
     @staticmethod
     def _parse_lines(lines: Iterable[str]) -> Tuple[Dict[str, str], Dict[str, str]]:
@@ -52,14 +111,56 @@ class FileMappingStore(MappingStore):
         content = self.path.read_text(encoding="utf-8").splitlines()
         return self._parse_lines(content)
 
+    def version(self) -> Optional[Hashable]:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return 0
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
     def save(self, forward: Dict[str, str]) -> None:
         # Persist deterministically: sort by ORIGINAL (case-insensitive)
         items = sorted(
             ((tok, orig) for orig, tok in forward.items()), key=lambda x: x[1].lower()
         )
-        with self.path.open("w", encoding="utf-8") as f:
-            for tok, orig in items:
-                f.write(f"{tok} = {orig}\n")
+        # temp file + rename: readers never see a half-written mapping
+        fd, tmp = tempfile.mkstemp(
+            dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for tok, orig in items:
+                    f.write(f"{tok} = {orig}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if self.path.exists():
+                shutil.copymode(self.path, tmp)
+            else:
+                os.chmod(tmp, 0o644)
+            os.replace(tmp, self.path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.appended = 0
+
+    def append(self, new_pairs: Dict[str, str]) -> None:
+        if not new_pairs:
+            return
+        data = "".join(f"{tok} = {orig}\n" for orig, tok in new_pairs.items())
+        with self.path.open("a+b") as f:
+            # hand-edited files may lack the final newline
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    data = "\n" + data
+            f.write(data.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        self.appended += len(new_pairs)
+
+    def compact(self) -> None:
+        forward, _ = self.load()
+        self.save(forward)
 
 
 # -------------------------------
@@ -69,42 +170,133 @@ class SqliteMappingStore(MappingStore):
     """
     Lightweight transactional store for container runtimes.
     Schema:
-      mapping(original TEXT PRIMARY KEY, token TEXT NOT NULL)
+      mapping(original TEXT PRIMARY KEY, token TEXT NOT NULL UNIQUE via index,
+              lead TEXT indexed)  -- lead = matcher.lead_key(original)
+      shapes(shape TEXT PRIMARY KEY, length INTEGER NOT NULL)
+      meta(key TEXT PRIMARY KEY, value INTEGER NOT NULL)  -- 'version', 'schema'
+
+    The indexes let lookup_*() resolve just the entries one document needs
+    with batched IN (...) queries instead of loading the whole table.
+
+    Connections are pooled per thread: PRAGMAs run once per connection and
+    sqlite3's statement cache keeps the prepared statements below. close()
+    shuts all of them down (API lifespan).
     """
 
+    _UPSERT = (
+        "INSERT INTO mapping(original, token, lead) VALUES(?, ?, ?) "
+        "ON CONFLICT(original) DO UPDATE SET token=excluded.token"
+    )
+    _ADD_SHAPE = "INSERT OR IGNORE INTO shapes(shape, length) VALUES(?, ?)"
+    _BUMP_VERSION = (
+        "INSERT INTO meta(key, value) VALUES('version', 1) "
+        "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+    )
+    _SELECT_VERSION = "SELECT value FROM meta WHERE key = 'version'"
+    _SCHEMA = 2  # 2: lead column + shapes table + token index
+    # bound parameters per IN (...) query; SQLite's floor limit is 999
+    _LOOKUP_BATCH = 500
+
     def __init__(self, db_path: Path) -> None:
         self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._pool_lock = threading.Lock()
+        self._connections: list[sqlite3.Connection] = []
+        self._generation = 0  # bumped by close(); stale thread-locals reconnect
         self._init_db()
 
     # --- internals ---
     def _connect(self) -> sqlite3.Connection:
-        # isolation_level=None = autocommit off by default -> we commit explicitly
-        con = sqlite3.connect(self.db_path)
+        # isolation_level default -> implicit BEGIN before DML, we commit explicitly;
+        # check_same_thread=False only so close() may run from the lifespan thread
+        con = sqlite3.connect(
+            self.db_path, check_same_thread=False, cached_statements=64
+        )
         # Ensure consistent text handling
         con.execute("PRAGMA journal_mode=WAL")
         con.execute("PRAGMA synchronous=NORMAL")
         return con
 
+    def _connection(self) -> sqlite3.Connection:
+        """The calling thread's pooled connection (opened on first use)."""
+        local = self._local
+        if getattr(local, "generation", None) != self._generation:
+            con = self._connect()
+            with self._pool_lock:
+                self._connections.append(con)
+            local.con, local.generation = con, self._generation
+        return local.con
+
+    def close(self) -> None:
+        with self._pool_lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        for con in connections:
+            con.close()
+
     def _init_db(self) -> None:
-        con = self._connect()
-        try:
+        with self._connection() as con:
             con.execute(
                 "CREATE TABLE IF NOT EXISTS mapping ("
                 "  original TEXT PRIMARY KEY,"
                 "  token    TEXT NOT NULL)"
             )
-            con.commit()
-        finally:
-            con.close()
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS meta ("
+                "  key   TEXT PRIMARY KEY,"
+                "  value INTEGER NOT NULL)"
+            )
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS shapes ("
+                "  shape  TEXT PRIMARY KEY,"
+                "  length INTEGER NOT NULL)"
+            )
+            row = con.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+            if (row[0] if row else 1) < self._SCHEMA:
+                self._upgrade(con)
+            con.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS mapping_token ON mapping(token)"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS mapping_lead ON mapping(lead)")
+
+    def _upgrade(self, con: sqlite3.Connection) -> None:
+        """Schema 1 -> 2: add + backfill the lead column and the shapes table."""
+        columns = {r[1] for r in con.execute("PRAGMA table_info(mapping)")}
+        if "lead" not in columns:
+            con.execute("ALTER TABLE mapping ADD COLUMN lead TEXT")
+        rows = con.execute("SELECT original, token FROM mapping").fetchall()
+        con.executemany(
+            "UPDATE mapping SET lead = ? WHERE original = ?",
+            ((lead_key(orig), orig) for orig, _ in rows),
+        )
+        con.executemany(
+            self._ADD_SHAPE, self._shapes_of(tok for _, tok in rows).items()
+        )
+        con.execute(
+            "INSERT INTO meta(key, value) VALUES('schema', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (self._SCHEMA,),
+        )
+
+    @staticmethod
+    def _shapes_of(tokens: Iterable[str]) -> Dict[str, int]:
+        return {token_shape(t): len(t) for t in tokens}
+
+    def _select_in(self, sql: str, keys: Iterable[str]) -> list:
+        """Run sql ("... IN ({})") for keys in batches of _LOOKUP_BATCH."""
+        con = self._connection()
+        keys = list(dict.fromkeys(keys))
+        rows: list = []
+        for i in range(0, len(keys), self._LOOKUP_BATCH):
+            batch = keys[i : i + self._LOOKUP_BATCH]
+            marks = ",".join("?" * len(batch))
+            rows.extend(con.execute(sql.format(marks), batch))
+        return rows
 
     # --- public API ---
     def load(self) -> Tuple[Dict[str, str], Dict[str, str]]:
-        con = self._connect()
-        try:
-            cur = con.execute("SELECT original, token FROM mapping")
-            rows = cur.fetchall()
-        finally:
-            con.close()
+        cur = self._connection().execute("SELECT original, token FROM mapping")
+        rows = cur.fetchall()
         forward = {orig: tok for (orig, tok) in rows}
         reverse = {tok: orig for (orig, tok) in rows}
         return forward, reverse
@@ -112,16 +304,39 @@ class SqliteMappingStore(MappingStore):
     def save(self, forward: Dict[str, str]) -> None:
         if not forward:
             return
-        con = self._connect()
-        try:
+        # connection as context manager: commit, or rollback on error
+        with self._connection() as con:
             con.executemany(
-                "INSERT INTO mapping(original, token) VALUES(?, ?) "
-                "ON CONFLICT(original) DO UPDATE SET token=excluded.token",
-                [(orig, tok) for orig, tok in forward.items()],
+                self._UPSERT, ((o, t, lead_key(o)) for o, t in forward.items())
             )
-            con.commit()
-        finally:
-            con.close()
+            con.executemany(self._ADD_SHAPE, self._shapes_of(forward.values()).items())
+            # same transaction as the data change: readers never see one
+            # without the other
+            con.execute(self._BUMP_VERSION)
+
+    def version(self) -> Optional[Hashable]:
+        row = self._connection().execute(self._SELECT_VERSION).fetchone()
+        return row[0] if row else 0
+
+    def append(self, new_pairs: Dict[str, str]) -> None:
+        # upsert touches only the new rows
+        self.save(new_pairs)
+
+    def lookup_originals(self, originals: Iterable[str]) -> Dict[str, str]:
+        sql = "SELECT original, token FROM mapping WHERE original IN ({})"
+        return dict(self._select_in(sql, originals))
+
+    def lookup_tokens(self, tokens: Iterable[str]) -> Dict[str, str]:
+        sql = "SELECT token, original FROM mapping WHERE token IN ({})"
+        return dict(self._select_in(sql, tokens))
+
+    def lookup_leads(self, keys: Iterable[str]) -> Dict[str, str]:
+        sql = "SELECT original, token FROM mapping WHERE lead IN ({})"
+        return dict(self._select_in(sql, keys))
+
+    def token_shapes(self) -> Dict[str, int]:
+        cur = self._connection().execute("SELECT shape, length FROM shapes")
+        return dict(cur.fetchall())
 
     # --- migration helper ---
     def migrate_from_file(self, txt_path: Path) -> int:
@@ -134,8 +349,7 @@ class SqliteMappingStore(MappingStore):
             return 0
 
         # If DB already has rows, do not touch it.
-        forward_db, _ = self.load()
-        if forward_db:
+        if self._connection().execute("SELECT 1 FROM mapping LIMIT 1").fetchone():
             return 0
 
         # Parse file using same rules as FileMappingStore
@@ -147,3 +361,349 @@ class SqliteMappingStore(MappingStore):
         # Bulk insert
         self.save(forward_file)
         return len(forward_file)
+
+
+# -------------------------------
+# Write-behind group commit (wraps any store)
+# -------------------------------
+class Commit:
+    """Ticket for pairs handed to WriteBehindStore.append()."""
+
+    def __init__(self) -> None:
+        self._done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+    def _finish(self, error: Optional[BaseException] = None) -> None:
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the pairs are committed; re-raises a failed commit."""
+        if not self._done.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+
+class WriteBehindStore(MappingStore):
+    """
+    Collect appended pairs from many callers and commit them to the inner
+    store in one transaction per batch: after `interval` seconds since the
+    first queued pair, or as soon as `max_batch` pairs are queued.
+
+    append() returns immediately with a Commit; callers that need durability
+    wait() on it (outside any lock, so other requests can join the batch).
+    Reads see queued pairs, and version() hides the store changes made by our
+    own flushes, so a MappingCache on top does not reload after each batch.
+    """
+
+    def __init__(
+        self, inner: MappingStore, *, interval: float = 0.05, max_batch: int = 1000
+    ) -> None:
+        self.inner = inner
+        self.interval = interval
+        self.max_batch = max_batch
+        self.commits = 0  # transactions issued
+        self.committed = 0  # pairs written
+        self._cond = threading.Condition()
+        self._pending: Dict[str, str] = {}
+        self._inflight: Dict[str, str] = {}
+        self._tickets: list[Commit] = []
+        self._first_at = 0.0
+        self._flush_now = False
+        self._closing = False
+        self._thread: Optional[threading.Thread] = None
+        # (inner version after our last flush, version callers saw before it)
+        self._alias: Optional[Tuple[Hashable, Hashable]] = None
+
+    def __getattr__(self, name: str):
+        # store-specific attributes (e.g. FileMappingStore.appended)
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    # --- queue ---
+    def append(self, new_pairs: Dict[str, str]) -> Commit:
+        commit = Commit()
+        if not new_pairs:
+            commit._finish()
+            return commit
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("write-behind store is closed")
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.update(new_pairs)
+            self._tickets.append(commit)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="mapping-write-behind", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+        return commit
+
+    def _next_batch(self) -> Optional[Tuple[Dict[str, str], list]]:
+        with self._cond:
+            while not self._pending and not self._closing:
+                self._cond.wait()
+            while not (self._closing or self._flush_now):
+                if len(self._pending) >= self.max_batch:
+                    break
+                remaining = self._first_at + self.interval - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if not self._pending:
+                return None  # closing with nothing left
+            batch, tickets = self._pending, self._tickets
+            self._pending, self._tickets = {}, []
+            self._inflight = batch
+            self._flush_now = False
+            return batch, tickets
+
+    def _run(self) -> None:
+        while True:
+            taken = self._next_batch()
+            if taken is None:
+                return
+            batch, tickets = taken
+            error: Optional[BaseException] = None
+            try:
+                before = self.version()
+                self.inner.append(batch)
+                after = self.inner.version()
+                self._alias = (after, before) if after is not None else None
+                self.commits += 1
+                self.committed += len(batch)
+            except BaseException as exc:  # handed to the waiting callers
+                error = exc
+            with self._cond:
+                self._inflight = {}
+            for ticket in tickets:
+                ticket._finish(error)
+
+    def flush(self) -> None:
+        """Commit everything queued so far and wait for it."""
+        with self._cond:
+            tickets = list(self._tickets)
+            self._flush_now = True
+            self._cond.notify()
+        for ticket in tickets:
+            ticket.wait()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        with self._cond:
+            self._thread = None
+            self._closing = False
+        self.inner.close()
+
+    # --- reads see queued pairs ---
+    def _queued(self) -> Dict[str, str]:
+        with self._cond:
+            return {**self._inflight, **self._pending}
+
+    def load(self) -> Tuple[Dict[str, str], Dict[str, str]]:
+        queued = self._queued()
+        forward, reverse = self.inner.load()
+        forward.update(queued)
+        reverse.update((tok, orig) for orig, tok in queued.items())
+        return forward, reverse
+
+    def lookup_originals(self, originals: Iterable[str]) -> Dict[str, str]:
+        originals = list(originals)
+        queued = self._queued()
+        found = self.inner.lookup_originals(o for o in originals if o not in queued)
+        found.update((o, queued[o]) for o in originals if o in queued)
+        return found
+
+    def lookup_tokens(self, tokens: Iterable[str]) -> Dict[str, str]:
+        tokens = list(tokens)
+        queued = {tok: orig for orig, tok in self._queued().items()}
+        found = self.inner.lookup_tokens(t for t in tokens if t not in queued)
+        found.update((t, queued[t]) for t in tokens if t in queued)
+        return found
+
+    def lookup_leads(self, keys: Iterable[str]) -> Dict[str, str]:
+        wanted = set(keys)
+        found = self.inner.lookup_leads(wanted)
+        found.update((o, t) for o, t in self._queued().items() if lead_key(o) in wanted)
+        return found
+
+    def token_shapes(self) -> Dict[str, int]:
+        shapes = self.inner.token_shapes()
+        shapes.update((token_shape(t), len(t)) for t in self._queued().values())
+        return shapes
+
+    def version(self) -> Optional[Hashable]:
+        version = self.inner.version()
+        alias = self._alias
+        if alias is not None and version == alias[0]:
+            return alias[1]
+        return version
+
+    # --- whole-store writes go through after the queue ---
+    def save(self, forward: Dict[str, str]) -> None:
+        self.flush()
+        self.inner.save(forward)
+
+    def compact(self) -> None:
+        self.flush()
+        self.inner.compact()
+
+
+# -------------------------------
+# In-process cache (API hot path)
+# -------------------------------
+class MappingCache:
+    """
+    Snapshot of a store's mapping plus the matchers derived from it.
+
+    The store is only re-read when store.version() changes, so request latency
+    follows document size instead of mapping size. Callers hold `lock` while
+    they read or extend the snapshot.
+    """
+
+    def __init__(self, store: MappingStore, *, boundary: str = BOUNDARY_AUTO) -> None:
+        self.store = store
+        self.boundary = boundary
+        self.lock = threading.RLock()
+        self.forward: Dict[str, str] = {}
+        self.reverse: Dict[str, str] = {}
+        self._version: Optional[Hashable] = None
+        self._loaded = False
+        self._terms: Optional[TermMatcher] = None
+        self._tokens: Optional[TokenMatcher] = None
+
+    def refresh(self) -> "MappingCache":
+        """Reload from the store if it changed since the last load/save."""
+        with self.lock:
+            version = self.store.version()
+            if not self._loaded or version is None or version != self._version:
+                self.forward, self.reverse = self.store.load()
+                self._terms = self._tokens = None
+                self._version = version
+                self._loaded = True
+        return self
+
+    def term_matcher(self) -> TermMatcher:
+        with self.lock:
+            if self._terms is None:
+                self._terms = TermMatcher(self.forward, boundary=self.boundary)
+            return self._terms
+
+    def token_matcher(self) -> TokenMatcher:
+        with self.lock:
+            if self._tokens is None:
+                self._tokens = TokenMatcher(self.reverse)
+            return self._tokens
+
+    def add(self, original: str, token: str) -> None:
+        """Register one new pair in the snapshot and both matchers."""
+        with self.lock:
+            self.forward[original] = token
+            self._register(original, token)
+
+    def adopt_new(self, since: int) -> Dict[str, str]:
+        """
+        Pick up entries appended to `forward` directly (e.g. by encode_text)
+        after it held `since` items. Returns them as ORIGINAL -> TOKEN.
+        """
+        with self.lock:
+            count = len(self.forward) - since
+            if count <= 0:
+                return {}
+            new = dict(reversed(list(islice(reversed(self.forward.items()), count))))
+            for original, token in new.items():
+                self._register(original, token)
+            return new
+
+    def _register(self, original: str, token: str) -> None:
+        self.reverse[token] = original
+        if self._terms is not None:
+            self._terms.add(original, token)
+        if self._tokens is not None:
+            self._tokens.add(token, original)
+
+    def save(self) -> None:
+        """Persist the snapshot and remember the resulting store version."""
+        with self.lock:
+            self.store.save(self.forward)
+            self._version = self.store.version()
+
+    def append(self, new_pairs: Dict[str, str]) -> Optional[Commit]:
+        """
+        Persist only new pairs (journal) and adopt the resulting version.
+        Returns the store's Commit ticket when it writes behind.
+        """
+        if not new_pairs:
+            return None
+        with self.lock:
+            commit = self.store.append(new_pairs)
+            self._version = self.store.version()
+        return commit
+
+    def compact(self) -> None:
+        """Rewrite the store canonically; the next refresh() reloads it."""
+        with self.lock:
+            self.store.compact()
+
+
+class DocumentMapping(MappingCache):
+    """
+    The slice of a store that one document can touch, resolved with the
+    store's selective lookups instead of a full load. Same surface as
+    MappingCache, so the API handlers work with either; new pairs are
+    appended to the store as usual.
+    """
+
+    def __init__(
+        self,
+        store: MappingStore,
+        forward: Dict[str, str],
+        *,
+        boundary: str = BOUNDARY_AUTO,
+    ) -> None:
+        super().__init__(store, boundary=boundary)
+        self.forward = forward
+        self.reverse = {tok: orig for orig, tok in forward.items()}
+        self._loaded = True
+
+    @classmethod
+    def for_encode(
+        cls,
+        store: MappingStore,
+        text: str,
+        originals: Iterable[str] = (),
+        *,
+        boundary: str = BOUNDARY_AUTO,
+    ) -> "DocumentMapping":
+        """
+        Entries whose leading word/character occurs in text (a superset of
+        what the TermMatcher can hit), plus any of originals already stored.
+        """
+        forward = store.lookup_leads(lead_keys(text))
+        missing = [o for o in originals if o not in forward]
+        if missing:
+            forward.update(store.lookup_originals(missing))
+        return cls(store, forward, boundary=boundary)
+
+    @classmethod
+    def for_decode(
+        cls, store: MappingStore, text: str, *, boundary: str = BOUNDARY_AUTO
+    ) -> "DocumentMapping":
+        """Entries for every token-shaped candidate in text."""
+        candidates = TokenMatcher.from_shapes(store.token_shapes()).candidates(text)
+        reverse = store.lookup_tokens(candidates)
+        forward = {orig: tok for tok, orig in reverse.items()}
+        return cls(store, forward, boundary=boundary)
+
+    def refresh(self) -> "DocumentMapping":
+        return self
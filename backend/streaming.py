@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+"""
+Chunked encode/decode building blocks with bounded memory.
+
+Text is fed in chunks; only a carry-over window (longest known original or
+token + one character of boundary context) is kept between chunks, so matches
+and [[...]] markers straddling chunk boundaries behave exactly as if the whole
+text had been processed at once.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Callable, Iterable, Iterator, Protocol
+
+DEFAULT_CHUNK_SIZE = 1 << 20  # characters per read
+
+
+class _Matcher(Protocol):
+    max_len: int
+
+    def iter_matches(
+        self, text: str, pos: int = 0, endpos: int | None = None
+    ) -> Iterator[tuple[int, int, str]]: ...
+
+
+def strip_markers(text: str) -> str:
+    """Remove leftover [[ / ]] the way anonymizer.encode_text does."""
+    return text.replace("[[", "").replace("]]", "")
+
+
+class WindowedReplacer:
+    """
+    Apply a TermMatcher/TokenMatcher to a stream of chunks.
+
+    feed() returns the output that is final so far, close() flushes the rest.
+    With strip=True, bracket runs are never split between two outputs, so
+    stripping per output piece equals stripping the whole text.
+    """
+
+    def __init__(self, matcher: _Matcher, *, strip: bool = False) -> None:
+        self.matcher = matcher
+        self.strip = strip
+        self._buf = ""
+        self._ctx = 0  # leading chars of _buf already emitted (boundary context)
+
+    def _emit(self, buf: str, stop: int | None) -> tuple[str, int]:
+        parts: list[str] = []
+        last = self._ctx
+        for start, end, repl in self.matcher.iter_matches(buf, self._ctx, stop):
+            parts.append(buf[last:start])
+            parts.append(repl)
+            last = end
+        if stop is None:
+            cut = len(buf)
+        else:
+            cut = max(last, stop)
+            if self.strip:
+                while cut > last and buf[cut - 1] in "[]" and buf[cut] in "[]":
+                    cut -= 1
+        parts.append(buf[last:cut])
+        out = "".join(parts)
+        return (strip_markers(out) if self.strip else out), cut
+
+    def feed(self, chunk: str) -> str:
+        buf = self._buf + chunk
+        # a match starting before `safe` ends before the last character of buf
+        safe = len(buf) - (self.matcher.max_len + 1)
+        if safe <= self._ctx:
+            self._buf = buf
+            return ""
+        out, cut = self._emit(buf, safe)
+        if cut <= self._ctx:  # only an unsplittable bracket run so far
+            self._buf = buf
+            return out
+        self._buf = buf[cut - 1 :]
+        self._ctx = 1
+        return out
+
+    def close(self) -> str:
+        out, _ = self._emit(self._buf, None)
+        self._buf = ""
+        self._ctx = 0
+        return out
+
+
+class MarkerCollector:
+    """
+    Collect [[...]] terms from a stream of chunks.
+
+    An unfinished marker is carried into the next chunk. Markers cannot span
+    lines (the marker pattern uses '.'), so the carry never outgrows a line.
+    """
+
+    def __init__(self, pattern: re.Pattern) -> None:
+        self.pattern = pattern
+        self._buf = ""
+
+    def feed(self, chunk: str) -> list[str]:
+        buf = self._buf + chunk
+        terms: list[str] = []
+        last = 0
+        for m in self.pattern.finditer(buf):
+            terms.append(m.group(1))
+            last = m.end()
+        rest = buf[last:]
+        rest = rest[rest.rfind("\n") + 1 :]
+        opened = rest.find("[[")
+        if opened >= 0:
+            self._buf = rest[opened:]
+        else:
+            self._buf = rest[-1:] if rest.endswith("[") else ""
+        return terms
+
+    @property
+    def pending(self) -> int:
+        """Length of the fed text's tail that may still be part of a marker."""
+        return len(self._buf)
+
+    def close(self) -> list[str]:
+        terms = [m.group(1) for m in self.pattern.finditer(self._buf)]
+        self._buf = ""
+        return terms
+
+
+class StreamEncoder:
+    """
+    Single-pass encode of a stream that cannot be read twice (HTTP body).
+
+    Marked terms are handed to assign() as soon as their closing ]] arrives,
+    and text is only passed on to the replacer once it can no longer be part
+    of an open marker, so assign() can add the term to the matcher before its
+    first marker is replaced. Unlike encode_text, plain occurrences before a
+    term's first marker are left as they are.
+    """
+
+    def __init__(
+        self, matcher: _Matcher, pattern: re.Pattern, assign: Callable[[str], None]
+    ) -> None:
+        self.assign = assign
+        self._collector = MarkerCollector(pattern)
+        self._replacer = WindowedReplacer(matcher, strip=True)
+        self._held = ""  # == the collector's pending tail
+
+    def feed(self, chunk: str) -> str:
+        for term in self._collector.feed(chunk):
+            self.assign(term)
+        data = self._held + chunk
+        cut = len(data) - self._collector.pending
+        self._held = data[cut:]
+        return self._replacer.feed(data[:cut])
+
+    def close(self) -> str:
+        for term in self._collector.close():
+            self.assign(term)
+        out = self._replacer.feed(self._held)
+        self._held = ""
+        return out + self._replacer.close()
+
+
+def iter_chunks(f, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def replace_stream(chunks: Iterable[str], replacer: WindowedReplacer) -> Iterator[str]:
+    for chunk in chunks:
+        out = replacer.feed(chunk)
+        if out:
+            yield out
+    tail = replacer.close()
+    if tail:
+        yield tail
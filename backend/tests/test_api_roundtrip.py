@@ -102,3 +102,141 @@ def test_mapping_echo_is_consistent(client: TestClient) -> None:
     # so existing keys keep their tokens; new keys remain as provided.
     assert enc2["mapping"]["Gamma"] == "GGGG2222"
     assert enc2["mapping"]["Alpha"] in {"AAAA1111", mapping.get("Alpha")}
+
+
+def test_external_mapping_change_is_picked_up(client: TestClient) -> None:
+    import api_server  # type: ignore
+
+    enc = _post_json(client, "/encode", {"text": "[[Zoe]]"})
+    assert enc["mapping"]["Zoe"] == enc["text"]
+    # another process rewrites the mapping file -> next request sees it
+    api_server.MAP_PATH.write_text(
+        "ZZZZ0000 = Zoe\nYYYY0000 = Yann\n", encoding="utf-8"
+    )
+    dec = _post_json(client, "/decode", {"text": "ZZZZ0000"})
+    assert dec["text"] == "Zoe"
+
+
+def test_encode_appends_only_new_pairs(client: TestClient) -> None:
+    import api_server  # type: ignore
+
+    _post_json(client, "/encode", {"text": "[[Zed]] [[Amy]]"})
+    before = api_server.MAP_PATH.read_text(encoding="utf-8")
+    _post_json(client, "/encode", {"text": "Zed [[Bea]] Amy"})
+    after = api_server.MAP_PATH.read_text(encoding="utf-8")
+    assert after.startswith(before)
+    assert after[len(before) :].endswith(" = Bea\n")
+    _post_json(client, "/encode", {"text": "Zed und Amy"})
+    assert api_server.MAP_PATH.read_text(encoding="utf-8") == after
+
+
+def test_sqlite_store_backend(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import api_server  # type: ignore
+
+    monkeypatch.setattr(api_server, "MAP_STORE", "sqlite", raising=True)
+    api_server.MAP_PATH.write_text("LEGACY01 = Legacy\n", encoding="utf-8")
+    enc = _post_json(client, "/encode", {"text": "Legacy [[Neu]]"})
+    assert enc["mapping"]["Legacy"] == "LEGACY01"
+    assert api_server.MAP_PATH.with_suffix(".db").exists()
+    dec = _post_json(client, "/decode", {"text": enc["text"]})
+    assert dec["text"] == "Legacy Neu"
+
+
+def test_selective_lookup_mode(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import api_server  # type: ignore
+
+    monkeypatch.setattr(api_server, "MAP_STORE", "sqlite", raising=True)
+    monkeypatch.setattr(api_server, "MAP_LOOKUP", "selective", raising=True)
+    api_server.MAP_PATH.write_text(
+        "LEGACY01 = Legacy\nOTHER002 = Unbeteiligt\n", encoding="utf-8"
+    )
+    enc = _post_json(client, "/encode", {"text": "Legacy [[Neu]]"})
+    # only the slice this document touches comes back
+    assert set(enc["mapping"]) == {"Legacy", "Neu"}
+    dec = _post_json(client, "/decode", {"text": enc["text"] + " OTHER002"})
+    assert dec["text"] == "Legacy Neu Unbeteiligt"
+
+
+def test_write_behind_group_commit(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import api_server  # type: ignore
+
+    monkeypatch.setattr(api_server, "MAP_STORE", "sqlite", raising=True)
+    monkeypatch.setattr(api_server, "WRITE_BEHIND_MS", 20, raising=True)
+    enc = _post_json(client, "/encode", {"text": "Hallo [[Alice]]"})
+    store = api_server._mapping_cache().store
+    assert isinstance(store, api_server.storage.WriteBehindStore)
+    # durable by default: committed before the response was sent
+    assert store.inner.lookup_originals(["Alice"]) == {"Alice": enc["mapping"]["Alice"]}
+    dec = _post_json(client, "/decode", {"text": enc["text"]})
+    assert dec["text"] == "Hallo Alice"
+
+
+def test_batch_endpoints_share_one_snapshot(client: TestClient) -> None:
+    import api_server  # type: ignore
+
+    texts = ["[[Alice]] ruft an", "Rückruf an Alice", "", "[[Bob]] und [[Alice]]"]
+    enc = _post_json(client, "/encode/batch", {"texts": texts})
+    assert len(enc["texts"]) == 4 and enc["texts"][2] == ""
+    alice, bob = enc["mapping"]["Alice"], enc["mapping"]["Bob"]
+    assert enc["texts"][1] == f"Rückruf an {alice}"
+    assert enc["texts"][3] == f"{bob} und {alice}"
+    # one persistence step for the whole batch
+    lines = api_server.MAP_PATH.read_text(encoding="utf-8").splitlines()
+    assert sorted(lines) == sorted([f"{alice} = Alice", f"{bob} = Bob"])
+
+    dec = _post_json(client, "/decode/batch", {"texts": enc["texts"]})
+    assert dec["texts"] == [t.replace("[[", "").replace("]]", "") for t in texts]
+
+
+def test_streaming_plain_text_roundtrip(client: TestClient) -> None:
+    import api_server  # type: ignore
+
+    original = "Hallo [[Alice]] und [[Super Nova]].\nAlice trifft Super Nova.\n" * 200
+
+    def body(text: str, size: int = 7):
+        for i in range(0, len(text), size):
+            yield text[i : i + size].encode("utf-8")
+
+    r = client.post(
+        "/encode/stream", content=body(original), headers={"content-type": "text/plain"}
+    )
+    assert r.status_code == 200
+    encoded = r.text
+    assert "Alice" not in encoded and "[[" not in encoded
+    assert "Alice" in api_server.MAP_PATH.read_text(encoding="utf-8")
+
+    r = client.post(
+        "/decode/stream",
+        content=body(encoded, 5),
+        headers={"content-type": "text/plain"},
+    )
+    assert r.text == original.replace("[[", "").replace("]]", "")
+
+
+def test_streaming_ndjson_records(client: TestClient) -> None:
+    import json
+
+    lines = [{"text": "[[Bob]] ruft an"}, {"text": "Rückruf an Bob"}]
+    payload = "".join(json.dumps(x) + "\n" for x in lines)
+    r = client.post(
+        "/encode/stream",
+        content=payload.encode("utf-8"),
+        headers={"content-type": "application/x-ndjson"},
+    )
+    out = [json.loads(line) for line in r.text.splitlines()]
+    bob = out[-1]["mapping"]["Bob"]
+    assert [o["text"] for o in out[:-1]] == [f"{bob} ruft an", f"Rückruf an {bob}"]
+
+    r = client.post(
+        "/decode/stream",
+        content=(json.dumps({"text": out[1]["text"]}) + "\nkaputt\n").encode(),
+        headers={"content-type": "application/x-ndjson"},
+    )
+    out = [json.loads(line) for line in r.text.splitlines()]
+    assert out[0] == {"text": "Rückruf an Bob"} and "error" in out[1]
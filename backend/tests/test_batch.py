@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import anonymizer
+import batch
+
+
+def _tree(root: Path) -> dict[Path, str]:
+    files = {
+        root / "a.txt": "[[Alice]] schreibt an [[Bob]].\n",
+        root / "sub" / "b.txt": "Bob antwortet [[Alice]] und [[Carol]].\n",
+        root / "sub" / "deep" / "c.txt": "Carol, Alice, Bob.\n",
+    }
+    for path, text in files.items():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    (root / "sub" / "skip.log").write_text("[[Mallory]]", encoding="utf-8")
+    return files
+
+
+def test_expand_paths_dirs_globs_and_files(tmp_path: Path) -> None:
+    files = _tree(tmp_path)
+    assert batch.expand_paths([str(tmp_path)]) == sorted(files)
+    assert batch.expand_paths([str(tmp_path / "**" / "*.log")]) == [
+        tmp_path / "sub" / "skip.log"
+    ]
+
+
+def test_batch_cli_consistent_tokens_and_roundtrip(tmp_path: Path, monkeypatch) -> None:
+    files = _tree(tmp_path / "docs")
+    monkeypatch.chdir(tmp_path)
+
+    assert anonymizer.main(["anonymizer.py", "encode", "docs", "--workers", "2"]) == 0
+    forward, _ = anonymizer.load_mapping(tmp_path / "mapping.txt")
+    assert set(forward) == {"Alice", "Bob", "Carol"}
+    for path in files:
+        encoded = path.read_text(encoding="utf-8")
+        assert not [w for w in ("Alice", "Bob", "Carol", "[[") if w in encoded]
+        assert forward["Alice"] in encoded
+    assert "Mallory" not in forward
+
+    assert anonymizer.main(["anonymizer.py", "decode", "docs", "--workers", "1"]) == 0
+    for path, text in files.items():
+        assert path.read_text(encoding="utf-8") == text.replace("[[", "").replace(
+            "]]", ""
+        )
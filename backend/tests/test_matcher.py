@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import matcher
+from matcher import BOUNDARY_AUTO, BOUNDARY_WORD, TermMatcher
+
+
+def test_longest_match_wins_regardless_of_mapping_order() -> None:
+    m = TermMatcher({"Müller": "TOK00001", "Müller AG": "TOK00002"})
+    assert m.sub("Die Müller AG und Herr Müller.") == "Die TOK00002 und Herr TOK00001."
+
+
+def test_word_boundaries_and_punctuation_edges() -> None:
+    m = TermMatcher({"Eve": "EEEE0000", "(c) Acme": "CCCC0000"})
+    # no match inside longer words, but punctuation-edged terms match anywhere
+    assert m.sub("Eve, Evelyn; x(c) Acme") == "EEEE0000, Evelyn; xCCCC0000"
+
+    strict = TermMatcher({"(c) Acme": "CCCC0000"}, boundary=BOUNDARY_WORD)
+    # \b before "(" needs a word character in front (anonymizer_core semantics)
+    assert strict.sub("x(c) Acme / (c) Acme") == "xCCCC0000 / (c) Acme"
+
+
+def test_matches_agree_with_per_term_patterns() -> None:
+    terms = {"Alice": "A", "Super Nova": "S", "Häßler": "H", "a-b": "X"}
+    text = "Alice+Super Nova, Häßler a-b xa-b Alicex Super Novas"
+    for mode in (BOUNDARY_AUTO, BOUNDARY_WORD):
+        m = TermMatcher(terms, boundary=mode)
+        found = {(s, e) for s, e, _ in m.iter_matches(text)}
+        expected = {
+            mm.span()
+            for term in terms
+            for mm in matcher.boundary_pattern(term, mode).finditer(text)
+        }
+        assert found == expected
+
+
+def test_matcher_for_extends_cached_index_in_place() -> None:
+    mapping = {"Alpha": "AAAA1111"}
+    first = matcher.matcher_for(mapping)
+    mapping["Beta"] = "BBBB2222"
+    assert matcher.matcher_for(mapping) is first
+    assert first.sub("Alpha Beta") == "AAAA1111 BBBB2222"
+
+    # changed token -> rebuild
+    rebuilt = matcher.matcher_for({"Alpha": "CCCC3333"})
+    assert rebuilt is not first
+    assert rebuilt.sub("Alpha Beta") == "CCCC3333 Beta"
+
+
+def test_token_matcher_decodes_mixed_token_shapes() -> None:
+    reverse = {"AAAA1111": "Alice", "A-NEW-9999": "Alpha", "T1": "Müller AG"}
+    dec = matcher.TokenMatcher(reverse)
+    text = "AAAA1111 trifft A-NEW-9999 und T1; Projekte/T12/AAAA11112 bleiben."
+    assert dec.sub(text) == (
+        "Alice trifft Alpha und Müller AG; Projekte/T12/AAAA11112 bleiben."
+    )
+
+
+def test_decoder_for_tracks_growing_mapping() -> None:
+    reverse = {"AAAA1111": "Alice"}
+    first = matcher.decoder_for(reverse)
+    reverse["B-2"] = "Bob"
+    assert matcher.decoder_for(reverse) is first
+    assert first.sub("AAAA1111 B-2") == "Alice Bob"
+
+
+def test_pattern_cache_lru_counters_and_retain() -> None:
+    cache = matcher.PatternCache(maxsize=2)
+    a = cache.get("Alice", BOUNDARY_AUTO)
+    assert cache.get("Alice", BOUNDARY_AUTO) is a
+    cache.get("Alice", BOUNDARY_WORD)  # different mode -> own entry
+    cache.get("Bob", BOUNDARY_AUTO)  # evicts least recently used
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 3, 2)
+    assert stats["evictions"] == 1
+
+    assert cache.retain({"Alice"}, BOUNDARY_AUTO) == 1  # Bob left the mapping
+    assert len(cache) == 1
+
+
+def test_token_candidates_cover_every_lookup() -> None:
+    reverse = {"AAAA1111": "Alice", "T1": "Müller AG"}
+    shapes = {matcher.token_shape(t): len(t) for t in reverse}
+    only_shapes = matcher.TokenMatcher.from_shapes(shapes)
+    text = "AAAA1111, T1 und ZZZZ9999; T12"
+    assert only_shapes.candidates(text) == {"AAAA1111", "T1", "ZZZZ9999"}
+    # resolving just the candidates decodes like the full mapping
+    found = {c: reverse[c] for c in only_shapes.candidates(text) if c in reverse}
+    assert matcher.TokenMatcher(found).sub(text) == matcher.TokenMatcher(reverse).sub(
+        text
+    )
+    assert {"Super", "Nova", "(", " "} <= matcher.lead_keys("(Super Nova)")
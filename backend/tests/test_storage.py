@@ -59,3 +59,187 @@ def test_sqlite_migration_from_mapping_txt(tmp_path: Path) -> None:
     # Second run should NOT import again
     imported_again = store.migrate_from_file(txt)
     assert imported_again == 0
+
+
+def test_mapping_cache_reloads_only_on_version_change(tmp_path: Path) -> None:
+    txt = tmp_path / "mapping.txt"
+    txt.write_text("AAAA1111 = Alice\n", encoding="utf-8")
+    store = storage.FileMappingStore(txt)
+    loads = 0
+    original_load = store.load
+
+    def counting_load():
+        nonlocal loads
+        loads += 1
+        return original_load()
+
+    store.load = counting_load  # type: ignore[method-assign]
+    cache = storage.MappingCache(store)
+
+    cache.refresh()
+    matcher = cache.term_matcher()
+    cache.refresh()
+    assert loads == 1 and cache.term_matcher() is matcher
+
+    # own writes keep the snapshot; new pairs reach both matchers
+    cache.add("Bob", "BBBB2222")
+    cache.save()
+    cache.refresh()
+    assert loads == 1
+    assert cache.token_matcher().sub("BBBB2222") == "Bob"
+    assert matcher.sub("Alice Bob") == "AAAA1111 BBBB2222"
+
+    # external change -> reload
+    txt.write_text("CCCC3333 = Carol\n", encoding="utf-8")
+    cache.refresh()
+    assert loads == 2 and cache.forward == {"Carol": "CCCC3333"}
+
+
+def test_sqlite_version_counter_changes_on_save(tmp_path: Path) -> None:
+    store = storage.SqliteMappingStore(tmp_path / "mapping.db")
+    v0 = store.version()
+    store.save({"Alpha": "AXXX0001"})
+    assert store.version() != v0
+
+
+def test_file_store_append_journal_and_compact(tmp_path: Path) -> None:
+    txt = tmp_path / "mapping.txt"
+    txt.write_text("BBBB2222 = Bob", encoding="utf-8")  # no trailing newline
+    store = storage.FileMappingStore(txt)
+
+    store.append({"Alice": "AAAA1111"})
+    store.append({"Bob": "CCCC3333"})  # later lines win
+    assert txt.read_text(encoding="utf-8").splitlines() == [
+        "BBBB2222 = Bob",
+        "AAAA1111 = Alice",
+        "CCCC3333 = Bob",
+    ]
+    assert store.appended == 2
+    assert store.load()[0] == {"Alice": "AAAA1111", "Bob": "CCCC3333"}
+
+    store.compact()
+    assert txt.read_text(encoding="utf-8").splitlines() == [
+        "AAAA1111 = Alice",
+        "CCCC3333 = Bob",
+    ]
+    assert store.appended == 0
+
+
+def test_sqlite_store_pools_connections_per_thread(tmp_path: Path) -> None:
+    import threading
+
+    store = storage.SqliteMappingStore(tmp_path / "mapping.db")
+    con = store._connection()
+    store.save({"Alpha": "AXXX0001"})
+    store.load()
+    assert store._connection() is con  # reused, PRAGMAs not re-run
+
+    other: list = []
+    t = threading.Thread(target=lambda: other.append(store._connection()))
+    t.start()
+    t.join()
+    assert other[0] is not con and len(store._connections) == 2
+
+    store.close()
+    assert store._connections == []
+    # usable again after close (fresh connection)
+    assert store.load()[0] == {"Alpha": "AXXX0001"}
+
+
+def test_sqlite_selective_lookups_match_full_load(tmp_path: Path) -> None:
+    import sqlite3
+
+    import pytest
+
+    store = storage.SqliteMappingStore(tmp_path / "mapping.db")
+    store._LOOKUP_BATCH = 2  # force several IN (...) batches
+    forward = {"Alice": "AAAA1111", "Super Nova": "S-NOVA-1", "(c) Acme": "CCCC3333"}
+    store.save(forward)
+
+    assert store.lookup_originals(["Alice", "Bob", "(c) Acme"]) == {
+        "Alice": "AAAA1111",
+        "(c) Acme": "CCCC3333",
+    }
+    assert store.lookup_tokens(["S-NOVA-1", "ZZZZ0000"]) == {"S-NOVA-1": "Super Nova"}
+    assert store.lookup_leads({"Super", "(", "Bob"}) == {
+        "Super Nova": "S-NOVA-1",
+        "(c) Acme": "CCCC3333",
+    }
+    base = storage.FileMappingStore(tmp_path / "mapping.txt")
+    base.save(forward)
+    assert store.token_shapes() == base.token_shapes()
+
+    with pytest.raises(sqlite3.IntegrityError):  # token column is unique
+        store.save({"Bob": "AAAA1111"})
+
+
+def test_sqlite_schema_upgrade_backfills_index_columns(tmp_path: Path) -> None:
+    import sqlite3
+
+    db = tmp_path / "mapping.db"
+    con = sqlite3.connect(db)  # schema 1: no lead column, no shapes table
+    con.execute("CREATE TABLE mapping (original TEXT PRIMARY KEY, token TEXT)")
+    con.execute("INSERT INTO mapping VALUES ('Müller AG', 'MMMM0001')")
+    con.commit()
+    con.close()
+
+    store = storage.SqliteMappingStore(db)
+    assert store.lookup_leads(["Müller"]) == {"Müller AG": "MMMM0001"}
+    assert store.token_shapes() == {r"(?<!\w)[A-Za-z0-9]{8}(?!\w)": 8}
+
+
+def test_document_mapping_resolves_only_what_text_can_hit(tmp_path: Path) -> None:
+    store = storage.SqliteMappingStore(tmp_path / "mapping.db")
+    store.save({"Alice": "AAAA1111", "Bob": "BBBB2222", "Alice Cooper": "CCCC3333"})
+
+    enc = storage.DocumentMapping.for_encode(store, "Alice Cooper trifft Alice")
+    assert enc.forward == {"Alice": "AAAA1111", "Alice Cooper": "CCCC3333"}
+    assert enc.term_matcher().sub("Alice Cooper trifft Alice") == (
+        "CCCC3333 trifft AAAA1111"
+    )
+
+    dec = storage.DocumentMapping.for_decode(store, "BBBB2222 und XXXX9999")
+    assert dec.reverse == {"BBBB2222": "Bob"}
+
+    dec.append({"Eve": "EEEE5555"})  # new pairs still reach the store
+    assert store.lookup_tokens(["EEEE5555"]) == {"EEEE5555": "Eve"}
+
+
+def test_write_behind_groups_concurrent_appends(tmp_path: Path) -> None:
+    import threading
+
+    inner = storage.SqliteMappingStore(tmp_path / "mapping.db")
+    store = storage.WriteBehindStore(inner, interval=0.2, max_batch=10_000)
+    cache = storage.MappingCache(store).refresh()
+    commits: list = []
+
+    def request(i: int) -> None:
+        commits.append(store.append({f"Name{i}": f"TOK{i:05d}"}))
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(50)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.lookup_originals(["Name7"]) == {"Name7": "TOK00007"}  # queued
+    assert all(c.wait(timeout=5) for c in commits)
+
+    assert store.commits < 5 and store.committed == 50
+    assert len(inner.load()[0]) == 50
+    # our own flushes do not look like external changes to the cache
+    assert cache.refresh().forward == {}
+    store.close()
+
+
+def test_write_behind_reports_failed_commit(tmp_path: Path) -> None:
+    import sqlite3
+
+    import pytest
+
+    inner = storage.SqliteMappingStore(tmp_path / "mapping.db")
+    inner.save({"Alice": "AAAA1111"})
+    store = storage.WriteBehindStore(inner, interval=0)
+    commit = store.append({"Bob": "AAAA1111"})  # duplicate token
+    with pytest.raises(sqlite3.IntegrityError):
+        commit.wait(timeout=5)
+    store.close()
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+import anonymizer
+from matcher import TermMatcher
+from streaming import MarkerCollector, WindowedReplacer, replace_stream
+
+
+def _chunks(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 8, 64])
+def test_windowed_replacer_matches_one_shot_encode(size: int) -> None:
+    forward = {"Müller AG": "MMMM0001", "Müller": "MMMM0002", "Bob": "BBBB0003"}
+    text = "[[Alice]] und die Müller AG; Müller, [[[Bob]]] und Bobby.\n" * 3
+    expected, forward = anonymizer.encode_text(text, dict(forward))
+
+    replacer = WindowedReplacer(TermMatcher(forward), strip=True)
+    assert "".join(replace_stream(_chunks(text, size), replacer)) == expected
+
+
+@pytest.mark.parametrize("size", [1, 4, 7])
+def test_marker_collector_handles_split_markers(size: int) -> None:
+    text = "a [[Super Nova]] b [[x\ny]] [[Eve]]"
+    collector = MarkerCollector(anonymizer._MARKED)
+    found = [t for chunk in _chunks(text, size) for t in collector.feed(chunk)]
+    found += collector.close()
+    assert found == ["Super Nova", "Eve"]
+
+
+def test_cli_stream_mode_roundtrip(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    original = "Hallo [[Alice]] und [[Super Nova]].\nAlice trifft Super Nova.\n" * 50
+    (tmp_path / "input.txt").write_text(original, encoding="utf-8")
+
+    assert (
+        anonymizer.main(["anonymizer.py", "encode", "--stream", "--chunk-size", "7"])
+        == 0
+    )
+    encoded = (tmp_path / "input.txt").read_text(encoding="utf-8")
+    assert "Alice" not in encoded and "[[" not in encoded
+
+    assert (
+        anonymizer.main(["anonymizer.py", "decode", "--stream", "--chunk-size", "5"])
+        == 0
+    )
+    decoded = (tmp_path / "input.txt").read_text(encoding="utf-8")
+    assert decoded == original.replace("[[", "").replace("]]", "")
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".tmp"] == []